@@ -43,6 +43,7 @@ async function run() {
         const copilotModel = tl.getInput("copilotModel", false) || "";
         const maxFiles = tl.getInput("maxFiles", false) || "50";
         const maxLinesPerFile = tl.getInput("maxLinesPerFile", false) || "1000";
+        const minChangedLines = tl.getInput("minChangedLines", false) || "1";
         const customPrompt = tl.getInput("customPrompt", false) || "";
         const promptFile = tl.getInput("promptFile", false) || "";
         const debug = tl.getInput("debug", false) || "false";
@@ -69,6 +70,7 @@ async function run() {
             INPUT_COPILOT_MODEL: copilotModel,
             INPUT_MAX_FILES: maxFiles,
             INPUT_MAX_LINES_PER_FILE: maxLinesPerFile,
+            INPUT_MIN_CHANGED_LINES: minChangedLines,
             INPUT_CUSTOM_PROMPT: customPrompt,
             INPUT_PROMPT_FILE: promptFile,
             INPUT_DEBUG: debug,
@@ -10,6 +10,7 @@ async function run(): Promise<void> {
     const copilotModel: string = tl.getInput("copilotModel", false) || "";
     const maxFiles: string = tl.getInput("maxFiles", false) || "50";
     const maxLinesPerFile: string = tl.getInput("maxLinesPerFile", false) || "1000";
+    const minChangedLines: string = tl.getInput("minChangedLines", false) || "1";
     const customPrompt: string = tl.getInput("customPrompt", false) || "";
     const promptFile: string = tl.getInput("promptFile", false) || "";
     const debug: string = tl.getInput("debug", false) || "false";
@@ -47,6 +48,7 @@ async function run(): Promise<void> {
       INPUT_COPILOT_MODEL: copilotModel,
       INPUT_MAX_FILES: maxFiles,
       INPUT_MAX_LINES_PER_FILE: maxLinesPerFile,
+      INPUT_MIN_CHANGED_LINES: minChangedLines,
       INPUT_CUSTOM_PROMPT: customPrompt,
       INPUT_PROMPT_FILE: promptFile,
       INPUT_DEBUG: debug,